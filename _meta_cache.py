@@ -0,0 +1,98 @@
+import os
+import time
+import sqlite3
+
+
+CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "gdrive_dl", "meta.sqlite"
+)
+# 缓存有效期（秒）
+CACHE_TTL = 24 * 60 * 60
+
+_conn = None
+
+
+def _connect():
+    """
+    打开（必要时创建）缓存数据库，进程内复用同一连接
+    :return: 数据库连接
+    """
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_info ("
+            "file_id TEXT PRIMARY KEY, name TEXT, size INTEGER, md5 TEXT, fetched_at REAL)"
+        )
+        _conn = conn
+    return _conn
+
+
+def get(file_id, ttl=CACHE_TTL):
+    """
+    读取缓存的文件信息
+    :param file_id: 文件 ID
+    :param ttl: 缓存有效期（秒）
+    :return: 与 Drive API 返回格式相同的文件信息，未命中或已过期时为 None
+    """
+    try:
+        row = (
+            _connect()
+            .execute(
+                "SELECT name, size, md5, fetched_at FROM file_info WHERE file_id = ?",
+                (file_id,),
+            )
+            .fetchone()
+        )
+    except (OSError, sqlite3.Error):
+        # 缓存不可用时退回到直接请求
+        return None
+    if row is None or time.time() - row[3] >= ttl:
+        return None
+    name, size, md5, _ = row
+    file_info = {"name": name}
+    if size is not None:
+        file_info["size"] = str(size)
+    if md5 is not None:
+        file_info["md5Checksum"] = md5
+    return file_info
+
+
+def put(file_id, file_info):
+    """
+    写入文件信息
+    :param file_id: 文件 ID
+    :param file_info: Drive API 返回的文件信息
+    """
+    size = file_info.get("size")
+    try:
+        conn = _connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO file_info VALUES (?, ?, ?, ?, ?)",
+                (
+                    file_id,
+                    file_info.get("name"),
+                    int(size) if size is not None else None,
+                    file_info.get("md5Checksum"),
+                    time.time(),
+                ),
+            )
+    except (OSError, sqlite3.Error):
+        pass
+
+
+def invalidate(file_id):
+    """
+    删除文件信息，远端文件可能已变化时调用
+    :param file_id: 文件 ID
+    """
+    try:
+        conn = _connect()
+        with conn:
+            conn.execute("DELETE FROM file_info WHERE file_id = ?", (file_id,))
+    except (OSError, sqlite3.Error):
+        pass
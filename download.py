@@ -1,77 +1,277 @@
 import io
 import os
+import re
+import sys
+import math
+import mmap
 import time
+import logging
+import json
+import uuid
+import errno
+import random
+import queue
+import shutil
 import hashlib
+import threading
+import email.parser
+import http.client
+import urllib3
+import requests
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
-from googleapiclient.discovery import build
+import _meta_cache
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.http import MediaIoBaseDownload, HttpError
+from google.auth.transport.requests import AuthorizedSession, Request
 
 
+logger = logging.getLogger("gdrive_dl")
+
 PORT = 29999
 SCOPES = [
     "https://www.googleapis.com/auth/drive.readonly",
     "https://www.googleapis.com/auth/drive.metadata.readonly",
 ]
+# 单次请求下载的分块大小，可通过环境变量 GDRIVE_CHUNK_SIZE 覆盖
+CHUNK_SIZE = int(os.environ.get("GDRIVE_CHUNK_SIZE", 32 * 1024 * 1024))
+# 顺序写入/校验时，每处理这么多字节通知内核丢弃一次已用完的页缓存
+CACHE_DROP_INTERVAL = 256 * 1024 * 1024
+# 后台写盘线程使用的缓冲区数量，即同时在途的分块数
+WRITE_QUEUE_DEPTH = 3
+# 逐块校验 MD5 时输出进度的间隔
+MD5_REPORT_INTERVAL = 512 * 1024 * 1024
+# 不超过该大小的文件用单次请求整体下载
+SMALL_FILE_THRESHOLD = 8 * 1024 * 1024
+FILES_URL = "https://www.googleapis.com/drive/v3/files/{file_id}"
+BATCH_URL = "https://www.googleapis.com/batch/drive/v3"
+# 单个批处理请求最多包含的子请求数
+BATCH_LIMIT = 100
+FILE_FIELDS = "name,size,md5Checksum"
+
+
+class RemoteSizeChanged(Exception):
+    """
+    远端文件大小与文件信息不一致，文件信息可能已过时
+    """
+
+
+# 进程内缓存的凭据与已授权会话，多次调用 run() 时复用
+_CREDS = None
+_SESSION = None
+# 并行下载子进程内复用的已授权会话
+_worker_session = None
 
 
-def run(file_id: str, save_dir: str, credentials_path: str, check_sum: bool = True):
+def run(
+    file_id: str,
+    save_dir: str,
+    credentials_path: str,
+    check_sum: bool = True,
+    workers: int = 8,
+):
     """
     运行下载任务，自动获取文件名，并存储到指定目录
     :param file_id: Google Drive 文件 ID
     :param save_dir: 下载目录
     :param credentials_path: 认证凭据文件路径
     :param check_sum: 是否校验文件的 MD5 值
+    :param workers: 大文件并行下载的进程数，为 1 时只使用断点续传下载
     :return: 下载是否成功
     """
     try:
-        creds = init_credentials(credentials_path)
+        session = get_session(credentials_path)
+        file_info = get_file_info(session, file_id)
+    except Exception as e:
+        logger.error("❌ 任务异常: %s", e)
+        return False
+    return download_with_info(
+        file_id, file_info, save_dir, credentials_path, check_sum, workers
+    )
+
+
+def run_many(
+    file_ids,
+    save_dir: str,
+    credentials_path: str,
+    check_sum: bool = True,
+    workers: int = 8,
+):
+    """
+    批量运行下载任务，先一次性获取所有文件信息，再依次下载
+    :param file_ids: Google Drive 文件 ID 列表
+    :param save_dir: 下载目录
+    :param credentials_path: 认证凭据文件路径
+    :param check_sum: 是否校验文件的 MD5 值
+    :param workers: 大文件并行下载的进程数，为 1 时只使用断点续传下载
+    :return: {文件 ID: 下载是否成功}
+    """
+    try:
+        session = get_session(credentials_path)
+        file_infos = get_file_infos(session, file_ids)
+    except Exception as e:
+        logger.warning("批量获取文件信息失败: %s, 改为逐个获取", e)
+        file_infos = {}
 
-        print(f"\n 开始下载任务: {file_id}")
+    results = {}
+    for file_id in file_ids:
+        if file_id in file_infos:
+            results[file_id] = download_with_info(
+                file_id,
+                file_infos[file_id],
+                save_dir,
+                credentials_path,
+                check_sum,
+                workers,
+            )
+        else:
+            # 批处理中失败的文件单独获取，以便报告具体错误
+            results[file_id] = run(
+                file_id, save_dir, credentials_path, check_sum, workers
+            )
+    return results
+
+
+def download_with_info(
+    file_id: str,
+    file_info: dict,
+    save_dir: str,
+    credentials_path: str,
+    check_sum: bool = True,
+    workers: int = 8,
+):
+    """
+    根据已获取的文件信息下载文件，并存储到指定目录
+    :param file_id: Google Drive 文件 ID
+    :param file_info: 文件信息
+    :param save_dir: 下载目录
+    :param credentials_path: 认证凭据文件路径
+    :param check_sum: 是否校验文件的 MD5 值
+    :param workers: 大文件并行下载的进程数，为 1 时只使用断点续传下载
+    :return: 下载是否成功
+    """
+    try:
+        session = get_session(credentials_path)
 
-        service = build("drive", "v3", credentials=creds)
+        logger.info("开始下载任务: %s", file_id)
 
         os.makedirs(save_dir, exist_ok=True)
 
-        file_info = get_file_info(service, file_id)
         file_name = file_info.get("name", "unknown")
         final_path = os.path.join(save_dir, file_name)
 
         if os.path.exists(final_path):
             if not check_sum:
-                print(f"\n 🆗 文件已下载成功: {final_path}")
+                logger.info("🆗 文件已下载成功: %s", final_path)
                 return True
-            if check_md5(final_path, file_info.get("md5Checksum", "")):
-                print(f"\n 🆗 文件已下载成功: {final_path}")
+            # 大小不一致时无需读取整个文件计算 MD5
+            if check_size(final_path, file_info) and check_md5(
+                final_path, file_info.get("md5Checksum", "")
+            ):
+                logger.info("🆗 文件已下载成功: %s", final_path)
                 return True
             else:
-                print(f"\n ⚠️ 文件已存在，但 MD5 不匹配，请手动处理: {final_path}")
+                logger.warning("⚠️ 文件已存在，但 MD5 不匹配，请手动处理: %s", final_path)
+                # 缓存的文件信息可能已过时，重新获取，信息有变化时按新信息处理
+                _meta_cache.invalidate(file_id)
+                fresh_info = get_file_info(session, file_id)
+                if fresh_info != file_info:
+                    return download_with_info(
+                        file_id,
+                        fresh_info,
+                        save_dir,
+                        credentials_path,
+                        check_sum,
+                        workers,
+                    )
 
         temp_path = os.path.join(save_dir, f"{file_id}.part")
+        total_size = int(file_info.get("size", 0))
 
-        success = resume_download(service, file_id, temp_path, file_info, max_retries=3)
+        md5_hex = None
+        # 大文件且没有未完成的断点续传文件时，使用分片并行下载
+        # 小文件始终走单次请求，即使 CHUNK_SIZE 被调得比阈值还小
+        if (
+            total_size > SMALL_FILE_THRESHOLD
+            and workers > 1
+            and total_size > CHUNK_SIZE
+            and not os.path.exists(temp_path)
+        ):
+            try:
+                success = parallel_download(
+                    _CREDS, file_id, final_path, total_size, workers=workers
+                )
+            except RemoteSizeChanged as e:
+                # 分片按缓存的大小划分，大小有变时按新的文件信息重新下载
+                logger.warning("%s, 重新获取文件信息", e)
+                _meta_cache.invalidate(file_id)
+                fresh_info = get_file_info(session, file_id)
+                if fresh_info == file_info:
+                    raise
+                return download_with_info(
+                    file_id,
+                    fresh_info,
+                    save_dir,
+                    credentials_path,
+                    check_sum,
+                    workers,
+                )
+        else:
+            if total_size <= SMALL_FILE_THRESHOLD:
+                success, md5_hex = download_small(
+                    session, file_id, temp_path, file_info, check_sum=check_sum
+                )
+            else:
+                success, md5_hex = resume_download(
+                    session, file_id, temp_path, file_info, check_sum=check_sum
+                )
+            if success:
+                move_file(temp_path, final_path)
 
         if success:
-            os.rename(temp_path, final_path)
-            print(f"\n ✅ 文件下载完成: {final_path}")
+            logger.info("✅ 文件下载完成: %s", final_path)
             if not check_sum:
                 return True
-            if check_md5(final_path, file_info.get("md5Checksum", "")):
-                print(f"\n 🆗 文件校验成功: {final_path}")
+            expected_md5 = file_info.get("md5Checksum", "")
+            # 并行下载的分片乱序写入，无法边下边算，需在下载完成后整体校验
+            if not check_size(final_path, file_info):
+                matched = False
+            elif md5_hex is None:
+                matched = check_md5(final_path, expected_md5)
+            else:
+                matched = md5_hex == expected_md5
+            if matched:
+                logger.info("🆗 文件校验成功: %s", final_path)
                 return True
             else:
-                print(f"\n ⚠️ 文件 md5 值不相符，请手动处理: {final_path}")
+                # 缓存的文件信息可能已过时，下次重新获取
+                _meta_cache.invalidate(file_id)
+                logger.warning("⚠️ 文件 md5 值不相符，请手动处理: %s", final_path)
                 return False
         else:
-            print(f"\n ❌ 文件下载失败: {file_id}")
-                
+            logger.error("❌ 文件下载失败: %s", file_id)
+            return False
+
     except Exception as e:
-        print(f"\n ❌ 任务异常: {e}")
+        logger.error("❌ 任务异常: %s", e)
         return False
 
 
+def get_session(credentials_path):
+    """
+    获取直接访问 Drive REST 接口的已授权会话，凭据有效时复用缓存，失效时刷新并重建
+    会话在多次请求间复用 TLS 连接，令牌过期时自动刷新
+    :param credentials_path: 认证凭据文件路径
+    :return: 已授权的会话
+    """
+    global _CREDS, _SESSION
+    if _SESSION is not None and _CREDS.valid:
+        return _SESSION
+    _CREDS = init_credentials(credentials_path)
+    _SESSION = AuthorizedSession(_CREDS)
+    return _SESSION
+
+
 def init_credentials(credentials_path):
     """
     初始化 Google Drive API 认证凭据
@@ -83,28 +283,84 @@ def init_credentials(credentials_path):
         creds = Credentials.from_authorized_user_file("token.json", SCOPES)
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
-            print("\n 认证凭据已过期，正在刷新...")
+            logger.info("认证凭据已过期，正在刷新...")
             try:
                 creds.refresh(Request())
             except Exception as e:
-                print(f"\n 刷新凭据失败: {e}, 请重新认证...")
+                logger.warning("刷新凭据失败: %s, 请重新认证...", e)
                 flow = InstalledAppFlow.from_client_secrets_file(
                     credentials_path, SCOPES
                 )
                 creds = flow.run_local_server(port=PORT)
         else:
-            print("\n 认证凭据不存在或无效，正在获取新的凭据...")
+            logger.info("认证凭据不存在或无效，正在获取新的凭据...")
             flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
             creds = flow.run_local_server(port=PORT)
         if not creds:
             raise Exception("获取凭据失败")
         with open("token.json", "w") as token:
-            print("\n 正在保存认证凭据...")
+            logger.info("正在保存认证凭据...")
             token.write(creds.to_json())
-            print("\n 认证凭据保存成功!")
+            logger.info("认证凭据保存成功!")
     return creds
 
 
+def move_file(src, dst):
+    """
+    移动文件，跨文件系统时在内核态复制后删除源文件
+    :param src: 源文件路径
+    :param dst: 目标文件路径
+    """
+    try:
+        os.replace(src, dst)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    # 先复制到目标目录下的临时文件，落盘后再原子替换，避免目标路径出现不完整的文件
+    tmp_path = os.path.join(
+        os.path.dirname(dst), f".{os.path.basename(dst)}.{os.getpid()}.tmp"
+    )
+    try:
+        try:
+            # copy_file_range 在支持 reflink 的文件系统上无需实际复制数据
+            with open(src, "rb") as fsrc, open(tmp_path, "wb") as fdst:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 2**30):
+                    pass
+        except (AttributeError, OSError) as e:
+            if isinstance(e, OSError) and e.errno not in (
+                errno.EXDEV,
+                errno.EINVAL,
+                errno.ENOSYS,
+                errno.EOPNOTSUPP,
+            ):
+                raise
+            # 平台或内核不支持时退回 shutil（Linux 下使用 sendfile）
+            shutil.copyfile(src, tmp_path)
+        with open(tmp_path, "r+b") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    os.unlink(src)
+
+
+def check_size(file_path, file_info):
+    """
+    检查文件大小是否与文件信息一致，没有大小信息时视为一致
+    :param file_path: 文件路径
+    :param file_info: 文件信息
+    :return: 是否一致
+    """
+    expected_size = file_info.get("size")
+    if expected_size is None:
+        return True
+    return os.path.getsize(file_path) == int(expected_size)
+
+
 def check_md5(file_path, expected_md5):
     """
     检查文件的 MD5 校验和
@@ -112,43 +368,121 @@ def check_md5(file_path, expected_md5):
     :param expected_md5: 预期的 MD5 校验和
     :return: 是否匹配
     """
-    print(f"\n 📥 正在校验文件md5: {file_path}")
+    logger.info("📥 正在校验文件md5: %s", file_path)
     md5 = hashlib.md5()
     file_size = os.path.getsize(file_path)
+
+    # 64 位系统上映射整个文件直接交给哈希函数，省去逐块 read 的系统调用与复制
+    if file_size > 0 and sys.maxsize > 2**32:
+        with open(file_path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+                mm.madvise(mmap.MADV_WILLNEED)
+            # 按固定间隔分段哈希并输出进度，切片 memoryview 不复制数据
+            with memoryview(mm) as view:
+                for start in range(0, file_size, MD5_REPORT_INTERVAL):
+                    md5.update(view[start : start + MD5_REPORT_INTERVAL])
+                    hashed = min(start + MD5_REPORT_INTERVAL, file_size)
+                    logger.info("已校验 %d/%d MiB", hashed >> 20, file_size >> 20)
+        return md5.hexdigest() == expected_md5
+
+    # Python 3.11+ 在 C 层完成整个读取与哈希循环
+    if hasattr(hashlib, "file_digest"):
+        with open(file_path, "rb") as f:
+            return hashlib.file_digest(f, "md5").hexdigest() == expected_md5
+
     chunk_size = 64 * 1024 * 1024 if file_size > 1024 * 1024 * 1024 else 4 * 1024 * 1024
-    with open(file_path, "rb") as f, tqdm(
-        total=file_size,
-        unit="B",
-        unit_scale=True,
-        unit_divisor=1024,
-        dynamic_ncols=True,
-        bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]",
-    ) as progress_bar:
+    hashed = 0
+    next_report = MD5_REPORT_INTERVAL
+    with open(file_path, "rb") as f:
         for chunk in iter(lambda: f.read(chunk_size), b""):
             md5.update(chunk)
-            progress_bar.update(len(chunk))
-    progress_bar.close()
+            hashed += len(chunk)
+            # 按固定间隔输出进度，避免在循环内频繁刷新进度条
+            if hashed >= next_report:
+                logger.info("已校验 %d/%d MiB", hashed >> 20, file_size >> 20)
+                next_report += MD5_REPORT_INTERVAL
     return md5.hexdigest() == expected_md5
 
 
-def resume_download(service, file_id, temp_path, file_info, max_retries=3):
+def download_small(
+    session, file_id, temp_path, file_info, max_retries=20, check_sum=True
+):
+    """
+    单次请求下载小文件，省去断点续传与后台写盘、哈希线程的开销
+    :param session: 已授权的会话
+    :param file_id: 文件 ID
+    :param temp_path: 临时文件路径
+    :param file_info: 文件信息
+    :param max_retries: 最大重试次数
+    :param check_sum: 是否计算 MD5 值
+    :return: (是否下载成功, 文件 MD5 值，未计算时为 None)
+    """
+    file_name = file_info.get("name", "unknown")
+    logger.info(
+        "📥 开始下载: %s, ID: %s, Size: %sB", file_name, file_id, file_info.get("size")
+    )
+
+    retries = 0
+    while True:
+        try:
+            resp = session.get(
+                FILES_URL.format(file_id=file_id),
+                params={"alt": "media", "supportsAllDrives": "true"},
+                timeout=60,
+            )
+            raise_for_status(resp)
+            data = resp.content
+            break
+        except (requests.RequestException, ConnectionError, TimeoutError) as e:
+            retries += 1
+            retry_wait = retry_delay(e, retries)
+            if retry_wait is None:
+                raise
+            if retries >= max_retries:
+                return False, None
+            logger.warning(
+                "发生错误: %s, %.1f 秒后重试 (%d/%d)...",
+                e,
+                retry_wait,
+                retries,
+                max_retries,
+            )
+            time.sleep(retry_wait)
+
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return True, hashlib.md5(data).hexdigest() if check_sum else None
+
+
+def resume_download(
+    session, file_id, temp_path, file_info, max_retries=20, check_sum=True
+):
     """
     断点续传 Google Drive 文件
-    :param service: 已授权的 Google Drive API 客户端
+    :param session: 已授权的会话
     :param file_id: 文件 ID
     :param temp_path: 临时文件路径
     :param file_info: 文件信息
     :param max_retries: 最大重试次数
-    :return: 是否下载成功
+    :param check_sum: 是否在下载的同时计算 MD5 值
+    :return: (是否下载成功, 文件 MD5 值，未计算时为 None)
     """
 
     file_name = file_info.get("name", "unknown")
     total_size = int(file_info.get("size", 0))
     offset = os.path.getsize(temp_path) if os.path.exists(temp_path) else 0
+    if total_size and offset > total_size:
+        # 临时文件比远端文件还大，内容不可信，重新下载
+        logger.warning("临时文件大小异常，重新下载: %s", temp_path)
+        os.truncate(temp_path, 0)
+        offset = 0
 
-    request = service.files().get_media(fileId=file_id)
-
-    print(f"\n 📥 开始下载: {file_name}, ID: {file_id}, Size: {total_size}B")
+    logger.info("📥 开始下载: %s, ID: %s, Size: %dB", file_name, file_id, total_size)
 
     # 创建进度条和文件对象
     with tqdm(
@@ -158,58 +492,703 @@ def resume_download(service, file_id, temp_path, file_info, max_retries=3):
         unit_divisor=1024,
         initial=offset,
         dynamic_ncols=True,
+        mininterval=1.0,
+        smoothing=0.1,
         bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]",
     ) as progress_bar, io.FileIO(temp_path, mode="ab") as f:
 
-        downloader = MediaIoBaseDownload(f, request, chunksize=10 * 1024 * 1024)
-        downloader._progress = offset
-        done = False
+        # 顺序写入提示内核按顺序预读/回写
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        # 临时文件已完整时无需再请求
+        done = bool(total_size) and offset >= total_size
         retries = 0
+        restart = False
+
+        # 哈希线程与下载线程分别绑定到不同 CPU，避免哈希状态随线程迁移被挤出缓存
+        cpus = []
+        if hasattr(os, "sched_getaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+        pin = check_sum and len(cpus) > 1
+
+        hasher = None
+        writer = None
+        saved_affinity = None
+        try:
+            # 后台线程读取已写入的数据计算 MD5，续传时先补算已有部分
+            if check_sum:
+                thread = Md5Hasher(temp_path, offset, cpu=cpus[-1] if pin else None)
+                thread.start()
+                hasher = thread
+            # 后台线程负责写盘，网络接收下一块时上一块仍可在写入
+            # 在绑定下载线程之前启动，使其不继承下载线程的 CPU
+            thread = ChunkWriter(f, offset, hasher)
+            thread.start()
+            writer = thread
+            if pin:
+                saved_affinity = pin_thread({cpus[0]})
+
+            while not done and retries < max_retries:
+                try:
+                    # 从当前偏移处请求剩余数据，连接中断后重新发起即可续传
+                    with session.get(
+                        FILES_URL.format(file_id=file_id),
+                        params={"alt": "media", "supportsAllDrives": "true"},
+                        headers={
+                            "Accept-Encoding": "identity",
+                            **({"Range": f"bytes={offset}-"} if offset else {}),
+                        },
+                        stream=True,
+                        timeout=60,
+                    ) as resp:
+                        raise_for_status(resp)
+                        if offset:
+                            # 服务端忽略 Range 返回完整内容时，清空临时文件从头下载
+                            if resp.status_code == 200:
+                                restart = True
+                                break
+                            content_range = parse_content_range(
+                                resp.headers.get("Content-Range", "")
+                            )
+                            if content_range is None or content_range[0] != offset:
+                                raise RuntimeError(
+                                    "续传响应的起始位置不符: "
+                                    f"{resp.headers.get('Content-Range')}, 预期 {offset}"
+                                )
+                        encoding = resp.headers.get("Content-Encoding", "identity")
+                        if encoding != "identity":
+                            raise RuntimeError(f"响应内容被编码: {encoding}")
+                        # 已要求 identity 编码，直接从底层 http.client 响应读入缓冲区，
+                        # 避免 urllib3 的 readinto 先分配 bytes 再复制
+                        raw = resp.raw._fp
+                        while True:
+                            buf = writer.acquire()
+                            n = 0
+                            try:
+                                n = raw.readinto(buf)
+                            finally:
+                                writer.submit(buf, n)
+                            if not n:
+                                break
+                            progress_bar.update(n)
 
-        while not done and retries < max_retries:
+                            offset += n
+
+                            retries = 0  # 成功下载一部分，重置重试计数
+
+                    if total_size and offset < total_size:
+                        raise ConnectionError(f"连接提前关闭: {offset}/{total_size}B")
+                    done = True
+
+                # 直接读取底层响应时，连接中断抛出 http.client 或 urllib3 的异常
+                except (
+                    requests.RequestException,
+                    urllib3.exceptions.HTTPError,
+                    http.client.HTTPException,
+                    ConnectionError,
+                    TimeoutError,
+                ) as e:
+                    retries += 1
+                    retry_wait = retry_delay(e, retries)
+                    if retry_wait is None:
+                        raise
+                    if retries >= max_retries:
+                        # 最后一次失败后不再等待
+                        logger.warning(
+                            "发生错误: %s, 已达最大重试次数 (%d)", e, max_retries
+                        )
+                        break
+                    logger.warning(
+                        "发生错误: %s, %.1f 秒后重试 (%d/%d)...",
+                        e,
+                        retry_wait,
+                        retries,
+                        max_retries,
+                    )
+                    time.sleep(retry_wait)
+        finally:
             try:
-                status, done = downloader.next_chunk()
+                if writer:
+                    writer.close()
+            finally:
+                if hasher:
+                    hasher.close()
+                if saved_affinity:
+                    pin_thread(saved_affinity)
+
+        # 数据落盘后再重命名，避免崩溃后目标文件内容不完整
+        if done:
+            os.fsync(f.fileno())
+
+    if restart:
+        logger.warning("服务端不支持续传，重新下载: %s", temp_path)
+        os.truncate(temp_path, 0)
+        return resume_download(
+            session, file_id, temp_path, file_info, max_retries, check_sum
+        )
+    if not done or not hasher:
+        return done, None
+    return done, hasher.hexdigest()
 
-                downloaded = status.resumable_progress
-                progress_bar.update(downloaded - offset)
 
-                offset = downloaded
+def parse_content_range(value):
+    """
+    解析 Content-Range 响应头
+    :param value: 形如 "bytes 0-99/1000" 的响应头
+    :return: (起始偏移, 结束偏移, 文件总大小)，总大小未知时为 None；格式不符时返回 None
+    """
+    match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)", value.strip())
+    if match is None:
+        return None
+    start, end, total = match.groups()
+    return int(start), int(end), None if total == "*" else int(total)
 
-                retries = 0  # 成功下载一部分，重置重试计数
 
-            except (HttpError, ConnectionError, TimeoutError) as e:
-                retries += 1
-                retry_wait = min(2**retries, 60)  # 指数退避，最多等待 60 秒
-                print(
-                    f"\n[WARN] 发生错误: {e}, {retry_wait} 秒后重试 ({retries}/{max_retries})..."
+def raise_for_status(resp):
+    """
+    响应状态异常时抛出 HTTPError
+    流式响应会在退出 with 时关闭，先读出错误内容供 retry_delay 判断原因
+    :param resp: 响应对象
+    """
+    if not resp.ok:
+        _ = resp.content
+        resp.raise_for_status()
+
+
+def retry_delay(e, retries):
+    """
+    计算重试前的等待时间
+    优先使用服务端返回的 Retry-After，否则使用带完全抖动的指数退避，最多等待 60 秒
+    :param e: 捕获的异常
+    :param retries: 当前重试次数
+    :return: 等待秒数，错误不可重试时为 None
+    """
+    response = getattr(e, "response", None)
+    if response is not None:
+        status = response.status_code
+        # 除限流外的 4xx 错误重试也不会成功
+        if 400 <= status < 500 and status not in (408, 429) and not (
+            status == 403 and _is_rate_limited(response)
+        ):
+            return None
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(int(retry_after), 60)
+    return random.uniform(0, min(2**retries, 60))
+
+
+def _is_rate_limited(response):
+    """
+    Drive 的限流错误以 403 返回，需根据错误原因区分
+    :param response: 响应对象
+    :return: 是否为限流错误
+    """
+    try:
+        errors = response.json()["error"]["errors"]
+        return any(
+            err.get("reason", "").lower().endswith("ratelimitexceeded")
+            for err in errors
+        )
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return False
+
+
+def pin_thread(cpus):
+    """
+    将当前线程绑定到指定的 CPU 集合，仅 Linux 支持
+    :param cpus: CPU 编号集合
+    :return: 绑定前的 CPU 集合，未能绑定时为 None
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return None
+    try:
+        previous = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, cpus)
+    except OSError:
+        return None
+    return previous
+
+
+def drop_page_cache(fd, length):
+    """
+    通知内核丢弃文件 [0, length) 范围内的干净页缓存，为网络缓冲腾出内存
+    :param fd: 文件描述符
+    :param length: 范围长度
+    """
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, length, os.POSIX_FADV_DONTNEED)
+
+
+class ChunkWriter(threading.Thread):
+    """
+    后台顺序写盘线程，持有一组可复用的缓冲区
+    网络线程取得空闲缓冲区并填充后提交，本线程写入文件后归还缓冲区
+    """
+
+    def __init__(self, f, offset=0, hasher=None, depth=WRITE_QUEUE_DEPTH):
+        """
+        :param f: 以追加模式打开的文件对象
+        :param offset: 文件当前长度
+        :param hasher: 写入后通知的 Md5Hasher，为 None 时改为定期丢弃页缓存
+        :param depth: 缓冲区数量
+        """
+        super().__init__(daemon=True)
+        self._f = f
+        self._offset = offset
+        self._dropped = offset
+        self._hasher = hasher
+        self._free = queue.Queue()
+        self._pending = queue.Queue()
+        self._error = None
+        for _ in range(depth):
+            self._free.put(memoryview(bytearray(CHUNK_SIZE)))
+
+    def acquire(self):
+        """
+        取得一块空闲缓冲区，所有缓冲区都在等待写入时阻塞
+        :return: 缓冲区
+        """
+        if self._error:
+            raise self._error
+        return self._free.get()
+
+    def submit(self, buf, n):
+        """
+        提交缓冲区中前 n 个字节等待写入，n 为 0 时仅归还缓冲区
+        """
+        self._pending.put((buf, n))
+
+    def close(self):
+        """
+        等待已提交的数据全部写入后退出线程
+        """
+        self._pending.put(None)
+        self.join()
+        if self._error:
+            raise self._error
+
+    def run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            buf, n = item
+            try:
+                if n and not self._error:
+                    self._write(buf[:n])
+            except OSError as e:
+                self._error = e
+            finally:
+                self._free.put(buf)
+
+    def _write(self, data):
+        end = self._offset + len(data)
+        while data:
+            data = data[self._f.write(data):]
+        if self._hasher:
+            self._hasher.feed(self._offset, end)
+        elif end - self._dropped >= CACHE_DROP_INTERVAL:
+            # 不计算 MD5 时写入的数据不会再被读取，可直接丢弃页缓存
+            drop_page_cache(self._f.fileno(), end)
+            self._dropped = end
+        self._offset = end
+
+
+class Md5Hasher(threading.Thread):
+    """
+    后台增量计算文件 MD5 的线程，按写入顺序读取新增的字节范围
+    """
+
+    def __init__(self, file_path, offset=0, cpu=None):
+        """
+        :param file_path: 文件路径
+        :param offset: 已存在的数据长度，启动后先计算 [0, offset) 部分
+        :param cpu: 线程绑定的 CPU 编号，为 None 时不绑定
+        """
+        super().__init__(daemon=True)
+        self.file_path = file_path
+        self.cpu = cpu
+        self._md5 = hashlib.md5()
+        self._ranges = queue.Queue()
+        self._error = None
+        if offset:
+            self._ranges.put((0, offset))
+
+    def feed(self, start, end):
+        """
+        提交新写入的字节范围 [start, end)
+        """
+        self._ranges.put((start, end))
+
+    def close(self):
+        """
+        通知线程处理完剩余数据后退出，并等待其结束
+        """
+        self._ranges.put(None)
+        self.join()
+
+    def hexdigest(self):
+        """
+        :return: 已处理数据的 MD5 值
+        """
+        if self._error:
+            raise self._error
+        return self._md5.hexdigest()
+
+    def run(self):
+        if self.cpu is not None:
+            pin_thread({self.cpu})
+        try:
+            fd = os.open(self.file_path, os.O_RDONLY)
+        except OSError as e:
+            self._error = e
+            fd = None
+        dropped = 0
+        try:
+            while True:
+                item = self._ranges.get()
+                if item is None:
+                    break
+                if fd is None or self._error:
+                    continue
+                start, end = item
+                try:
+                    while start < end:
+                        buf = os.pread(fd, min(end - start, CHUNK_SIZE), start)
+                        if not buf:
+                            break
+                        self._md5.update(buf)
+                        start += len(buf)
+                    # 已计算过的数据不会再被读取，丢弃其页缓存
+                    if start - dropped >= CACHE_DROP_INTERVAL:
+                        drop_page_cache(fd, start)
+                        dropped = start
+                except OSError as e:
+                    self._error = e
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+
+def parallel_download(
+    creds, file_id, path, total_size, workers=8, shard_size=CHUNK_SIZE, max_retries=20
+):
+    """
+    按字节范围分片，多进程并行下载 Google Drive 文件
+    分片直接写入预分配文件的对应偏移处，不支持断点续传
+    Linux 下写入无目录项的 O_TMPFILE 文件，完成后才链接到目标路径，中断时不留残余文件
+    :param creds: 已授权的凭据
+    :param file_id: 文件 ID
+    :param path: 目标文件路径
+    :param total_size: 文件大小
+    :param workers: 并行进程数
+    :param shard_size: 分片大小
+    :param max_retries: 单个分片的最大重试次数
+    :return: 是否下载成功
+    """
+    if not creds.valid:
+        creds.refresh(Request())
+
+    save_dir = os.path.dirname(path) or "."
+    fd = open_tmpfile(save_dir)
+    anonymous = fd is not None
+    if anonymous:
+        # 子进程通过本进程的 /proc 链接打开同一个匿名文件
+        shard_path = f"/proc/{os.getpid()}/fd/{fd}"
+    else:
+        shard_path = os.path.join(save_dir, f"{file_id}.ppart")
+        fd = os.open(shard_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    try:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, total_size)
+        else:
+            os.ftruncate(fd, total_size)
+
+        if not _download_shards(
+            creds, file_id, shard_path, total_size, workers, shard_size, max_retries
+        ):
+            return False
+
+        os.fsync(fd)
+        if anonymous:
+            link_tmpfile(fd, path)
+        else:
+            move_file(shard_path, path)
+        return True
+    finally:
+        os.close(fd)
+
+
+def _download_shards(
+    creds, file_id, path, total_size, workers, shard_size, max_retries
+):
+    """
+    提交所有分片到进程池并等待完成
+    :return: 是否全部下载成功
+    """
+    # 进程数不超过分片数
+    workers = min(workers, math.ceil(total_size / shard_size))
+    logger.info(
+        "📥 开始并行下载: %s, Size: %dB, Workers: %d", file_id, total_size, workers
+    )
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_shard_worker,
+        initargs=(creds.to_json(),),
+    )
+    try:
+        with tqdm(
+        total=total_size,
+        unit="B",
+        unit_scale=True,
+            unit_divisor=1024,
+            dynamic_ncols=True,
+            mininterval=1.0,
+            smoothing=0.1,
+            bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]",
+        ) as progress_bar:
+            futures = [
+                executor.submit(
+                    _download_shard,
+                    file_id,
+                    path,
+                    start,
+                    min(start + shard_size, total_size),
+                    total_size,
+                    max_retries,
                 )
-                time.sleep(retry_wait)
+                for start in range(0, total_size, shard_size)
+            ]
+            for future in as_completed(futures):
+                progress_bar.update(future.result())
+    except Exception as e:
+        # 取消排队中的分片，不等待仍在重试的分片
+        executor.shutdown(wait=False, cancel_futures=True)
+        if isinstance(e, RemoteSizeChanged):
+            raise
+        logger.warning("分片下载失败: %s", e)
+        return False
+
+    executor.shutdown()
+    return True
+
+
+def open_tmpfile(save_dir):
+    """
+    在目录下创建没有目录项的临时文件 (O_TMPFILE)
+    :param save_dir: 所在目录
+    :return: 文件描述符，平台或文件系统不支持时为 None
+    """
+    if not hasattr(os, "O_TMPFILE"):
+        return None
+    try:
+        return os.open(save_dir, os.O_TMPFILE | os.O_WRONLY, 0o644)
+    except OSError as e:
+        if e.errno in (errno.EISDIR, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOENT):
+            return None
+        raise
+
 
-    return done
+def link_tmpfile(fd, path):
+    """
+    为 O_TMPFILE 文件创建目录项，目标已存在时原子替换
+    :param fd: 临时文件的描述符
+    :param path: 目标文件路径
+    """
+    dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        name = os.path.basename(path)
+        # 指定 dst_dir_fd 使 os.link 走 linkat(AT_SYMLINK_FOLLOW)，链接到文件本身
+        try:
+            os.link(f"/proc/self/fd/{fd}", name, dst_dir_fd=dir_fd)
+        except FileExistsError:
+            tmp_name = f".{name}.{os.getpid()}.tmp"
+            os.link(f"/proc/self/fd/{fd}", tmp_name, dst_dir_fd=dir_fd)
+            os.replace(tmp_name, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _init_shard_worker(creds_json):
+    """
+    初始化并行下载子进程，创建已授权会话以复用连接，令牌过期时会话自动刷新
+    :param creds_json: 序列化的凭据
+    """
+    global _worker_session
+    creds = Credentials.from_authorized_user_info(json.loads(creds_json), SCOPES)
+    _worker_session = AuthorizedSession(creds)
 
 
-def get_file_info(service, file_id):
+def _download_shard(file_id, path, start, end, total_size, max_retries):
     """
-    获取 Google Drive 文件信息
-    :param service: 已授权的 Google Drive API 客户端
+    下载 [start, end) 字节范围并写入文件对应偏移处
+    :param file_id: 文件 ID
+    :param path: 输出文件路径
+    :param start: 起始偏移
+    :param end: 结束偏移（不包含）
+    :param total_size: 预期的文件大小
+    :param max_retries: 最大重试次数
+    :return: 写入的字节数
+    """
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        pos = start
+        retries = 0
+        while pos < end:
+            before = pos
+            try:
+                with _worker_session.get(
+                    FILES_URL.format(file_id=file_id),
+                    params={"alt": "media", "supportsAllDrives": "true"},
+                    headers={"Range": f"bytes={pos}-{end - 1}"},
+                    stream=True,
+                    timeout=60,
+                ) as resp:
+                    raise_for_status(resp)
+                    # 服务端忽略 Range 时返回完整内容，写入会覆盖其他分片
+                    if resp.status_code != 206:
+                        raise RuntimeError(
+                            f"分片请求未返回部分内容: HTTP {resp.status_code}"
+                        )
+                    content_range = parse_content_range(
+                        resp.headers.get("Content-Range", "")
+                    )
+                    if content_range and content_range[2] not in (None, total_size):
+                        raise RemoteSizeChanged(
+                            f"远端文件大小已变化: {content_range[2]}B, 预期 {total_size}B"
+                        )
+                    for chunk in resp.iter_content(1024 * 1024):
+                        chunk = chunk[: end - pos]
+                        os.pwrite(fd, chunk, pos)
+                        pos += len(chunk)
+                        if pos >= end:
+                            break
+                # 响应正常结束却没有数据时按失败重试，避免无限循环
+                if pos == before:
+                    raise requests.ConnectionError("分片响应没有数据")
+                retries = 0
+            except requests.RequestException as e:
+                # 只有取得进展时才重置重试计数
+                retries = retries + 1 if pos == before else 1
+                retry_wait = retry_delay(e, retries)
+                if retry_wait is None or retries >= max_retries:
+                    raise
+                time.sleep(retry_wait)
+    finally:
+        os.close(fd)
+    return end - start
+
+
+def get_file_info(session, file_id):
+    """
+    获取 Google Drive 文件信息，优先使用本地缓存
+    :param session: 已授权的会话
     :param file_id: 文件 ID
     :return: 文件信息
     """
-    return (
-        service.files()
-        .get(
-            fileId=file_id,
-            fields="name,size,md5Checksum",
-            supportsAllDrives=True,
-        )
-        .execute()
+    file_info = _meta_cache.get(file_id)
+    if file_info is not None:
+        return file_info
+    resp = session.get(
+        FILES_URL.format(file_id=file_id),
+        params={"fields": FILE_FIELDS, "supportsAllDrives": "true"},
+        timeout=60,
     )
+    resp.raise_for_status()
+    file_info = resp.json()
+    _meta_cache.put(file_id, file_info)
+    return file_info
+
+
+def get_file_infos(session, file_ids):
+    """
+    批量获取 Google Drive 文件信息
+    未缓存的文件通过批处理请求获取，每 BATCH_LIMIT 个文件只需一次往返
+    :param session: 已授权的会话
+    :param file_ids: 文件 ID 列表
+    :return: {文件 ID: 文件信息}，获取失败的文件不在其中
+    """
+    file_infos = {}
+    missing = []
+    for file_id in dict.fromkeys(file_ids):
+        file_info = _meta_cache.get(file_id)
+        if file_info is None:
+            missing.append(file_id)
+        else:
+            file_infos[file_id] = file_info
+
+    for i in range(0, len(missing), BATCH_LIMIT):
+        for file_id, file_info in _batch_get_file_info(
+            session, missing[i : i + BATCH_LIMIT]
+        ).items():
+            _meta_cache.put(file_id, file_info)
+            file_infos[file_id] = file_info
+    return file_infos
+
+
+def _batch_get_file_info(session, file_ids):
+    """
+    发送一个 multipart/mixed 批处理请求，获取多个文件的信息
+    :param session: 已授权的会话
+    :param file_ids: 文件 ID 列表，不超过 BATCH_LIMIT 个
+    :return: {文件 ID: 文件信息}，子请求失败的文件不在其中
+    """
+    boundary = f"batch_{uuid.uuid4().hex}"
+    body = "".join(
+        f"--{boundary}\r\n"
+        "Content-Type: application/http\r\n"
+        f"Content-ID: <{file_id}>\r\n"
+        "\r\n"
+        f"GET /drive/v3/files/{file_id}?fields={FILE_FIELDS}&supportsAllDrives=true\r\n"
+        "\r\n"
+        for file_id in file_ids
+    )
+    body += f"--{boundary}--\r\n"
+
+    resp = session.post(
+        BATCH_URL,
+        data=body.encode(),
+        headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+        timeout=60,
+    )
+    raise_for_status(resp)
+
+    return _parse_batch_response(
+        resp.headers["Content-Type"], resp.content, file_ids
+    )
+
+
+def _parse_batch_response(content_type, content, file_ids):
+    """
+    解析批处理响应，响应同样是 multipart/mixed，每部分为一个 HTTP 响应，Content-ID 为 <response-文件ID>
+    :param content_type: 响应的 Content-Type 头，包含分隔符
+    :param content: 响应内容
+    :param file_ids: 请求的文件 ID 列表
+    :return: {文件 ID: 文件信息}，子请求失败的文件不在其中
+    """
+    header = f"Content-Type: {content_type}\r\n\r\n".encode()
+    message = email.parser.BytesParser().parsebytes(header + content)
+    file_infos = {}
+    for part in message.get_payload():
+        file_id = part.get("Content-ID", "").strip("<>").replace("response-", "", 1)
+        # 子响应没有声明字符集，按字节取出，由 json 按 UTF-8 解码文件名
+        payload = part.get_payload(decode=True).replace(b"\r\n", b"\n")
+        head, _, body = payload.partition(b"\n\n")
+        status = int(head.split(None, 2)[1])
+        if status == 200 and file_id in file_ids:
+            file_infos[file_id] = json.loads(body)
+    return file_infos
 
 
 if __name__ == "__main__":
 
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     # 示例用法
-    file_id = ""
+    file_ids = [""]
     save_dir = ""
     credentials_path = "credential.json"
-    run(file_id, save_dir, credentials_path, check_sum=True)
+    run_many(file_ids, save_dir, credentials_path, check_sum=True)
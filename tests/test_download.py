@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import download
+except ImportError:  # 依赖未安装时跳过
+    download = None
+
+
+BOUNDARY = "batch_test"
+
+
+def _batch_part(content_id, status_line, body):
+    return (
+        f"--{BOUNDARY}\r\n"
+        "Content-Type: application/http\r\n"
+        f"Content-ID: <response-{content_id}>\r\n"
+        "\r\n"
+        f"{status_line}\r\n"
+        "Content-Type: application/json; charset=UTF-8\r\n"
+        "\r\n"
+        f"{body}\r\n"
+    ).encode("utf-8")
+
+
+@unittest.skipIf(download is None, "依赖未安装")
+class ParseBatchResponseTest(unittest.TestCase):
+    def test_non_ascii_name_and_failed_part(self):
+        content = (
+            _batch_part(
+                "abc",
+                "HTTP/1.1 200 OK",
+                '{"name": "测试文件.txt", "size": "10", "md5Checksum": "ff"}',
+            )
+            + _batch_part(
+                "def",
+                "HTTP/1.1 404 Not Found",
+                '{"error": {"code": 404, "message": "File not found"}}',
+            )
+            + f"--{BOUNDARY}--\r\n".encode()
+        )
+
+        file_infos = download._parse_batch_response(
+            f"multipart/mixed; boundary={BOUNDARY}", content, ["abc", "def"]
+        )
+
+        self.assertEqual(
+            file_infos,
+            {"abc": {"name": "测试文件.txt", "size": "10", "md5Checksum": "ff"}},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()